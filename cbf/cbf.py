@@ -79,6 +79,11 @@ class KBM_VC_CBF2D():
                 Update the obstacle list so that it is non-empty in order  \
                 to move forward.")
 
+        # The barrier functions do not depend on the control input, so they
+        # are evaluated once per solve in a single pass over the obstacles.
+        # G => Gradient, Gh -> (m,3)
+        h, Gh = self.obstacle_list2d.evaluate_all(self._p)
+
         def F(x = None, z=None):
 
             # if x is None: return m, matrix(0.0, (n, 1))
@@ -92,12 +97,10 @@ class KBM_VC_CBF2D():
             Df[0, :] = 2 * (x - u_ref).T * self._R
 
             gc = matrix([ [np.cos(self._theta), np.sin(self._theta), 0], [0, 0, 1] ])
-            # G => Gradient, Gh -> (m,3)
-            Gh = matrix([ [self.obstacle_list2d.dx(self._p)], [self.obstacle_list2d.dy(self._p)], [self.obstacle_list2d.dtheta(self._p)] ])
             
             Lxg_h = Gh * gc
 
-            f[1:] = -( Lxg_h * x + ( self._alpha * self.obstacle_list2d.f(self._p) ) )
+            f[1:] = -( Lxg_h * x + ( self._alpha * h ) )
             Df[1:, :] = -Lxg_h
 
             if z is None: return f, Df
@@ -179,6 +182,11 @@ class DBM_CBF_2DS():
                 Update the obstacle list so that it is non-empty in order  \
                 to move forward.")
 
+        # G => Gradient, Gh -> (m,4)
+        h, Gh = self.obstacle_list2d.evaluate_all()
+        Gh = matrix([ [Gh], [self.obstacle_list2d.dv()] ])
+        dt_h = self.obstacle_list2d.dt()
+
         def F(x = None, z=None):
 
             # if x is None: return m, matrix(0.0, (n, 1))
@@ -195,15 +203,11 @@ class DBM_CBF_2DS():
             g_c = self.gc()
 
             f_c = self.fc()
-
-            # G => Gradient, Gh -> (m,3)
-            Gh = matrix([ [self.obstacle_list2d.dx()], [self.obstacle_list2d.dy()],\
-                 [self.obstacle_list2d.dtheta()], [self.obstacle_list2d.dv()] ])
             
             Lxg_h = Gh * g_c
             Lxf_h = Gh * f_c
 
-            f[1:] = -( Lxf_h + Lxg_h * x + ( self._alpha * self.obstacle_list2d.f() )  + self.obstacle_list2d.dt())
+            f[1:] = -( Lxf_h + Lxg_h * x + ( self._alpha * h )  + dt_h)
             Df[1:, :] = -Lxg_h
 
             if z is None: return f, Df
@@ -258,6 +262,11 @@ class DUM_CBF_2DS(DBM_CBF_2DS):
                 Update the obstacle list so that it is non-empty in order  \
                 to move forward.")
 
+        # G => Gradient, Gh -> (m,4)
+        h, Gh = self.obstacle_list2d.evaluate_all()
+        Gh = matrix([ [Gh], [self.obstacle_list2d.dv()] ])
+        dt_h = self.obstacle_list2d.dt()
+
         def F(x = None, z=None):
 
             # if x is None: return m, matrix(0.0, (n, 1))
@@ -274,15 +283,11 @@ class DUM_CBF_2DS(DBM_CBF_2DS):
             g_c = self.gc()
 
             f_c = self.fc()
-
-            # G => Gradient, Gh -> (m,3)
-            Gh = matrix([ [self.obstacle_list2d.dx()], [self.obstacle_list2d.dy()],\
-                 [self.obstacle_list2d.dtheta()], [self.obstacle_list2d.dv()] ])
             
             Lxg_h = Gh * g_c
             Lxf_h = Gh * f_c
 
-            f[1:] = -( Lxf_h + Lxg_h * x + ( self._alpha * self.obstacle_list2d.f() )  + self.obstacle_list2d.dt())
+            f[1:] = -( Lxf_h + Lxg_h * x + ( self._alpha * h )  + dt_h)
             Df[1:, :] = -Lxg_h
 
             if z is None: return f, Df
@@ -377,6 +382,11 @@ class SADBM_CBF_2DS(DBM_CBF_2DS):
                 Update the obstacle list so that it is non-empty in order  \
                 to move forward.")
 
+        # G => Gradient, Gh -> (m,5)
+        h, Gh = self.obstacle_list2d.evaluate_all()
+        Gh = matrix([ [Gh], [self.obstacle_list2d.dv()], [self.obstacle_list2d.dbeta()] ])
+        dt_h = self.obstacle_list2d.dt()
+
         def F(x = None, z=None):
 
             # if x is None: return m, matrix(0.0, (n, 1))
@@ -393,15 +403,11 @@ class SADBM_CBF_2DS(DBM_CBF_2DS):
             g_c = self.gc()
 
             f_c = self.fc()
-
-            # G => Gradient, Gh -> (m,3)
-            Gh = matrix([ [self.obstacle_list2d.dx()], [self.obstacle_list2d.dy()],\
-                 [self.obstacle_list2d.dtheta()], [self.obstacle_list2d.dv()], [self.obstacle_list2d.dbeta()] ])
             
             Lxg_h = Gh * g_c
             Lxf_h = Gh * f_c
 
-            f[1:] = -( Lxf_h + Lxg_h * x + ( self._alpha * self.obstacle_list2d.f() )  + self.obstacle_list2d.dt())
+            f[1:] = -( Lxf_h + Lxg_h * x + ( self._alpha * h )  + dt_h)
             Df[1:, :] = -Lxg_h
 
             if z is None: return f, Df
@@ -11,10 +11,11 @@ author: Neelaksh Singh
 # Removal of the following method for Type Hinting Enclosing
 # classes is possible. Be cautious about the changes.
 from __future__ import annotations
-from multiprocessing.sharedctypes import Value
 
 import sys
 import os
+import math
+import weakref
 from typing import Dict
 import warnings
 import enum
@@ -22,11 +23,10 @@ import enum
 import numpy as np
 import scipy.optimize as sciopt
 
-from euclid import *
+from euclid import Vector2, Vector3, Point2
 from cvxopt import matrix
 from collections.abc import MutableMapping
 from numpy.polynomial.polynomial import Polynomial
-from sympy import Point
 
 from cbf.utils import vec_norm
 
@@ -40,6 +40,75 @@ try:
 except:
     raise
 
+# Numba is optional, the vectorized NumPy kernels are used without it.
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# Field (row) indices of the ellipse SoA parameter block, see ObstacleList2D.
+_CX, _CY, _CT, _ST, _IA2, _IB2, _KXA, _KXB, _KYA, _KYB = range(10)
+_N_ELLIPSE_FIELDS = 10
+
+def _ellipse_f_grad_loop(px, py, params, start, stop, out):
+    """
+    Evaluates the ellipse CBF and its x, y derivatives at (px, py) for the
+    obstacles in rows [start, stop) of the SoA parameter block in a single
+    pass, writing f, dx and dy into the rows of the preallocated `out` array.
+    Compiled with numba when available.
+    """
+    for i in range(start, stop):
+        dx_ = px - params[_CX, i]
+        dy_ = py - params[_CY, i]
+        u = dx_ * params[_CT, i] + dy_ * params[_ST, i]
+        v = -dx_ * params[_ST, i] + dy_ * params[_CT, i]
+        out[0, i] = u * u * params[_IA2, i] + v * v * params[_IB2, i] - 1.0
+        out[1, i] = params[_KXA, i] * u + params[_KXB, i] * v
+        out[2, i] = params[_KYA, i] * u + params[_KYB, i] * v
+
+def _ellipse_f_grad_aligned_loop(px, py, params, start, stop, out):
+    """
+    Specialization of `_ellipse_f_grad_loop` for axis-aligned ellipses
+    (theta = 0), where u, v reduce to the plain offsets from the center.
+    """
+    for i in range(start, stop):
+        dx_ = px - params[_CX, i]
+        dy_ = py - params[_CY, i]
+        out[0, i] = dx_ * dx_ * params[_IA2, i] + dy_ * dy_ * params[_IB2, i] - 1.0
+        out[1, i] = params[_KXA, i] * dx_
+        out[2, i] = params[_KYB, i] * dy_
+
+def _ellipse_f_grad_numpy(px, py, params, start, stop, out):
+    """
+    NumPy fallback of `_ellipse_f_grad_loop` with the same signature.
+    """
+    P = params[:, start:stop]
+    dx_ = px - P[_CX]
+    dy_ = py - P[_CY]
+    u = dx_ * P[_CT] + dy_ * P[_ST]
+    v = -dx_ * P[_ST] + dy_ * P[_CT]
+    out[0, start:stop] = u * u * P[_IA2] + v * v * P[_IB2] - 1.0
+    out[1, start:stop] = P[_KXA] * u + P[_KXB] * v
+    out[2, start:stop] = P[_KYA] * u + P[_KYB] * v
+
+def _ellipse_f_grad_aligned_numpy(px, py, params, start, stop, out):
+    """
+    NumPy fallback of `_ellipse_f_grad_aligned_loop` with the same signature.
+    """
+    P = params[:, start:stop]
+    dx_ = px - P[_CX]
+    dy_ = py - P[_CY]
+    out[0, start:stop] = dx_ * dx_ * P[_IA2] + dy_ * dy_ * P[_IB2] - 1.0
+    out[1, start:stop] = P[_KXA] * dx_
+    out[2, start:stop] = P[_KYB] * dy_
+
+if njit is not None:
+    _ellipse_f_grad = njit(cache=True, fastmath=True)(_ellipse_f_grad_loop)
+    _ellipse_f_grad_aligned = njit(cache=True, fastmath=True)(_ellipse_f_grad_aligned_loop)
+else:
+    _ellipse_f_grad = _ellipse_f_grad_numpy
+    _ellipse_f_grad_aligned = _ellipse_f_grad_aligned_numpy
+
 # Identity Objects
 class IdentityObjects(enum.Enum):
     """
@@ -140,9 +209,25 @@ class Ellipse2D(Obstacle2DBase):
     """
     Generates the 2D Ellipse obstacle representation for use in control barrier functions.
     Exposes the required functionality for direct usage in CBF as a barrier constraint.
+    The axes `a` and `b` are the core axes plus the buffer while it is applied,
+    assigning them sets the core axes accordingly.
+    Assignments to `center`, `theta`, `a`, `b` and `buffer` are reported to the
+    obstacle lists containing the object. In-place changes of the `center`
+    vector are not, assign a new vector instead.
+    The orientation `theta` is always in radians. Bounding boxes carry a
+    cbf.geometry.Rotation whose yaw is in radians as well (it feeds the euclid
+    quaternions), so CARLA's yaw in degrees has to be converted once when the
+    BoundingBox is built, never in the update path.
 
     """
     
+    # Warn on ignored apply_buffer/remove_buffer calls. Off by default since
+    # the warnings module inspects the call stack on every warning.
+    DEBUG = False
+    # (weakref to ObstacleList2D, key) pairs of the obstacle lists containing
+    # the object, maintained by the lists.
+    _owners = ()
+    
     def __init__(self, a: float, b: float, center: Vector2 = Vector2(0, 0), theta: float=0, buffer: float=0, **kwargs):
         """
         Initializes the Ellipse2D Object. 
@@ -153,51 +238,155 @@ class Ellipse2D(Obstacle2DBase):
         
         if not isinstance(center, Vector2):
             raise TypeError("Expected an object of type euclid.Vector2 for arg center, but got " + type(center).__name__ + ".")
-        self.center = center
-        self.theta = theta
+        self._center = center
+        self._theta = theta
         self.vel = Vector2()
-        self.a = a + buffer
-        self.b = b + buffer
-        self.buffer = buffer
+        self._trig_theta = None
+        self._a0 = a
+        self._b0 = b
+        self._buffer = buffer
         self.BUFFER_FLAG = True
+        self._refresh_coeffs()
 
     def __repr__(self):
         return f"{type(self).__name__}(a = {self.a}, b = {self.b}, center = {self.center}, theta = {self.theta}, buffer = {self.buffer}, buffer_applied: {self.BUFFER_FLAG} )\n"
     
+    def _refresh_coeffs(self, ct: float=None, st: float=None):
+        """
+        Sets the buffered axes a, b and caches the quantities which only change
+        with the orientation and the axes of the ellipse, i.e. cos/sin of theta,
+        1/a^2, 1/b^2 and the derivative coefficients, then reports the
+        modification to the containing obstacle lists. Called by the setters
+        of theta, a, b and buffer and once after the internal updates. Already
+        evaluated cos/sin of theta can be passed in to skip the trig calls,
+        which are also skipped when theta is unchanged.
+        """
+        offset = self.buffer if self.BUFFER_FLAG else 0.0
+        self._a = self._a0 + offset
+        self._b = self._b0 + offset
+        if ct is None or st is None:
+            if self.theta == self._trig_theta:
+                ct = self._ct
+                st = self._st
+            else:
+                ct = math.cos(self.theta)
+                st = math.sin(self.theta)
+        self._trig_theta = self.theta
+        self._ct = ct
+        self._st = st
+        self._inv_a2 = 1.0/(self.a * self.a)
+        self._inv_b2 = 1.0/(self.b * self.b)
+        # Coefficients of dx = kxa * u + kxb * v and dy = kya * u + kyb * v.
+        self._kxa = 2 * self._ct * self._inv_a2
+        self._kxb = -2 * self._st * self._inv_b2
+        self._kya = 2 * self._st * self._inv_a2
+        self._kyb = 2 * self._ct * self._inv_b2
+        self._notify_owners()
+    
+    @property
+    def center(self):
+        return self._center
+    
+    @center.setter
+    def center(self, center):
+        self._center = center
+        self._notify_owners()
+    
+    @property
+    def theta(self):
+        return self._theta
+    
+    @theta.setter
+    def theta(self, theta):
+        self._theta = theta
+        self._refresh_coeffs()
+    
+    @property
+    def a(self):
+        return self._a
+    
+    @a.setter
+    def a(self, a):
+        self._a0 = a - (self.buffer if self.BUFFER_FLAG else 0.0)
+        self._refresh_coeffs()
+    
+    @property
+    def b(self):
+        return self._b
+    
+    @b.setter
+    def b(self, b):
+        self._b0 = b - (self.buffer if self.BUFFER_FLAG else 0.0)
+        self._refresh_coeffs()
+    
+    @property
+    def buffer(self):
+        return self._buffer
+    
+    @buffer.setter
+    def buffer(self, buffer):
+        self._buffer = buffer
+        self._refresh_coeffs()
+    
+    def _add_owner(self, owner, key):
+        # Drops the entries of the lists which no longer exist.
+        self._owners = tuple(entry for entry in self._owners if entry[0]() is not None) + ((weakref.ref(owner), key),)
+    
+    def _remove_owner(self, owner, key):
+        self._owners = tuple(entry for entry in self._owners if not (entry[0]() is owner and entry[1] == key))
+    
+    def _notify_owners(self):
+        """
+        Marks the object as modified in all the obstacle lists containing it.
+        """
+        for ref, key in self._owners:
+            owner = ref()
+            if owner is not None:
+                owner._mark_dirty(key)
+    
     def apply_buffer(self):
         if not self.BUFFER_FLAG:
-            self.a = self.a + self.buffer
-            self.b = self.b + self.buffer
             self.BUFFER_FLAG = True
-        else:
+            self._refresh_coeffs()
+        elif self.DEBUG:
             warnings.warn("Warning: Buffer already applied. Call Ignored.")
         
     def remove_buffer(self):
         if self.BUFFER_FLAG:
-            self.a = self.a - self.buffer
-            self.b = self.b - self.buffer
             self.BUFFER_FLAG = False
-        else:
+            self._refresh_coeffs()
+        elif self.DEBUG:
             warnings.warn("Warning: Buffer already removed. Call Ignored.")
     
+    def _compute_uv(self):
+        """
+        Returns the coordinates (u, v) of the current state point in the
+        frame of the ellipse, shared by the evaluation and all derivatives.
+        """
+        xd = self.s[0] - self.center.x
+        yd = self.s[1] - self.center.y
+        u = xd * self._ct + yd * self._st
+        v = -xd * self._st + yd * self._ct
+        return u, v
+    
     def evaluate(self, **kwargs):
         """
         Evaluate the value of the ellipse at a given point.
         """
-        p = Point2(self.s[0], self.s[1])
-        dx = p.x - self.center.x
-        dy = p.y - self.center.y
-        ct = np.cos(self.theta)
-        st = np.sin(self.theta)
-
-        eval = ( ( dx * ct + dy * st )/self.a )**2 + ( ( -dx * st + dy * ct )/self.b )**2 - 1
+        u, v = self._compute_uv()
+        eval = u * u * self._inv_a2 + v * v * self._inv_b2 - 1
         return eval
 
     def gradient(self, **kwargs):
-        return matrix([self.dx(**kwargs), 
-                       self.dy(**kwargs), 
-                       self.dtheta(**kwargs), 
-                       self.dv(**kwargs)])
+        """
+        Fused gradient, computes (u, v) once for both non-zero derivatives.
+        dtheta and dv are identically zero.
+        """
+        u, v = self._compute_uv()
+        return matrix([self._kxa * u + self._kxb * v,
+                       self._kya * u + self._kyb * v,
+                       0.0,
+                       0.0])
 
     # f = evaluate
         
@@ -208,60 +397,59 @@ class Ellipse2D(Obstacle2DBase):
         return self.evaluate(**kwargs)
     
     def dx(self, **kwargs):
-        p = Point2(self.s[0], self.s[1])
-        super().dx(**kwargs)
-        xd = p.x - self.center.x
-        yd = p.y - self.center.y
-        ct = np.cos(self.theta)
-        st = np.sin(self.theta)
-
-        dx_ = (2 * ct/(self.a**2)) * ( xd * ct + yd * st ) + (-2 * st/(self.b**2)) * ( -xd * st + yd * ct )
+        u, v = self._compute_uv()
+        dx_ = self._kxa * u + self._kxb * v
         return dx_
     
     def dy(self, **kwargs):
-        p = Point2(self.s[0], self.s[1])
-        super().dy(**kwargs)
-        xd = p.x - self.center.x
-        yd = p.y - self.center.y
-        ct = np.cos(self.theta)
-        st = np.sin(self.theta)
-
-        dy_ = (2 * st/(self.a**2)) * ( xd * ct + yd * st ) + (2 * ct/(self.b**2)) * ( -xd * st + yd * ct )
+        u, v = self._compute_uv()
+        dy_ = self._kya * u + self._kyb * v
         return dy_
 
     def dv(self, **kwargs):
         """
         Despite being zero. This function is still created for the sake of completeness w.r.t API.
         """
-        return super().dy(**kwargs)
+        return 0
     
-    def update(self, s: matrix=None, s_obs: matrix=None, center: float=None, buffer: float=None, **kwargs):
+    def update(self, s: matrix=None, s_obs: matrix=None, center: Vector2=None, buffer: float=None, **kwargs):
         
         if 'a' in kwargs.keys():
-            self.a = kwargs['a']
+            self._a0 = kwargs['a']
             
         if 'b' in kwargs.keys():
-            self.a = kwargs['b']
+            self._b0 = kwargs['b']
             
         if 'theta' in kwargs.keys():
-            self.theta = kwargs['theta']
+            self._theta = kwargs['theta']
+        
+        if center is not None:
+            self._center = center
         
         if s_obs is not None:
             center = Point2(s_obs[0], s_obs[1])
-            self.center = center
+            self._center = center
         
         if s is not None:
             self.s = s
             self.vel = s[3]
-            self.theta = s[2]
+            self._theta = s[2]
         
         if buffer is not None:
-            if self.BUFFER_FLAG:
-                self.a = self.a - self.buffer + buffer
-                self.b = self.b - self.buffer + buffer
-                self.buffer = buffer
-            else:
-                self.buffer = buffer
+            self._buffer = buffer
+        
+        self._refresh_coeffs()
+    
+    def _set_pose(self, center: Vector2, a: float, b: float, theta: float, ct: float, st: float):
+        """
+        Sets the center, core axes and orientation with cos/sin of theta
+        evaluated by the caller. Used by the batched updates of the obstacle list.
+        """
+        self._center = center
+        self._a0 = a
+        self._b0 = b
+        self._theta = theta
+        self._refresh_coeffs(ct, st)
     
     def update_coords(self, xy: Point2):
         self.center = xy
@@ -273,7 +461,7 @@ class Ellipse2D(Obstacle2DBase):
         """
         Assumes that theta is the heading the calculates the vector.
         """
-        self.vel = Vector2(x=v*np.cos(self.theta), y=v*np.sin(self.theta))
+        self.vel = Vector2(x=v*self._ct, y=v*self._st)
         pass
 
     def update_velocity(self, v: Vector2):
@@ -286,7 +474,8 @@ class Ellipse2D(Obstacle2DBase):
         pass
 
     def update_orientation(self, yaw: float):
-        self.theta = yaw
+        self._theta = yaw
+        self._refresh_coeffs()
         _v_mag = self.vel.magnitude()
         self.update_velocity_by_magnitude(_v_mag)
         pass
@@ -298,22 +487,21 @@ class Ellipse2D(Obstacle2DBase):
         a = bbox.extent.x
         b = bbox.extent.y
         center = Vector2(bbox.location.x, bbox.location.y)
+        # Radians, see the class docstring.
         theta = bbox.rotation.yaw
         self.update(a=a, b=b, center=center, theta=theta)
 
-    def dtheta(self, *kwargs):
+    def dtheta(self, **kwargs):
         """
         Despite being zero. This function is still created for the sake of completeness w.r.t API.
         """
-        return super().dtheta(**kwargs)
+        return 0
     
     def dt(self, **kwargs):
-        p = Point2(self.s[0], self.s[1])
-        super().dt(**kwargs)
-        xd = p.x - self.center.x
-        yd = p.y - self.center.y
+        xd = self.s[0] - self.center.x
+        yd = self.s[1] - self.center.y
 
-        dt_ = -2 * ( (xd/self.a**2) * self.vel.x + (yd/self.b**2) * self.vel.y )
+        dt_ = -2 * ( (xd * self._inv_a2) * self.vel.x + (yd * self._inv_b2) * self.vel.y )
         return dt_
     
     @classmethod
@@ -327,6 +515,7 @@ class Ellipse2D(Obstacle2DBase):
         a = bbox.extent.x
         b = bbox.extent.y
         center = Vector2(bbox.location.x, bbox.location.y)
+        # Radians, see the class docstring.
         theta = bbox.rotation.yaw
         return cls(a, b, center, theta, buffer, id=id)
     
@@ -362,10 +551,10 @@ class CollisionCone2D(Obstacle2DBase):
         self.s_obs = matrix(s_obs)
         self.cx = self.s_obs[0]
         self.cy = self.s_obs[1]
-        self.s_vx = s[3]*np.cos(s[2])
-        self.s_vy = s[3]*np.sin(s[2])
-        self.s_obs_vx = s_obs[3]*np.cos(s_obs[2])
-        self.s_obs_vy = s_obs[3]*np.sin(s_obs[2])
+        self.s_vx = self.s[3]*math.cos(self.s[2])
+        self.s_vy = self.s[3]*math.sin(self.s[2])
+        self.s_obs_vx = self.s_obs[3]*math.cos(self.s_obs[2])
+        self.s_obs_vy = self.s_obs[3]*math.sin(self.s_obs[2])
         self.p_rel = self.s[:2] - self.s_obs[:2]
         self.v_rel = matrix([ self.s_vx - self.s_obs_vx, self.s_vy - self.s_obs_vy])
         self.dist = vec_norm(self.p_rel)
@@ -484,10 +673,11 @@ class CollisionCone2D(Obstacle2DBase):
         
         self.cx = self.s_obs[0]
         self.cy = self.s_obs[1]
-        self.s_vx = self.s[3]*np.cos(self.s[2])
-        self.s_vy = self.s[3]*np.sin(self.s[2])
-        self.s_obs_vx = self.s_obs[3]*np.cos(self.s_obs[2] + self.beta)
-        self.s_obs_vy = self.s_obs[3]*np.sin(self.s_obs[2] + self.beta)
+        # Scalar libm trig, no array dispatch for a single pose update.
+        self.s_vx = self.s[3]*math.cos(self.s[2])
+        self.s_vy = self.s[3]*math.sin(self.s[2])
+        self.s_obs_vx = self.s_obs[3]*math.cos(self.s_obs[2] + self.beta)
+        self.s_obs_vy = self.s_obs[3]*math.sin(self.s_obs[2] + self.beta)
         self.p_rel = self.s[:2] - self.s_obs[:2]
         self.v_rel = matrix([ self.s_vx - self.s_obs_vx, self.s_vy - self.s_obs_vy])
         self.dist = vec_norm(self.p_rel)
@@ -799,6 +989,35 @@ class ObstacleList2D(MutableMapping):
 
     def __init__(self, data=()):
         self.mapping = {}
+        # Structure-of-Arrays storage of the contained Ellipse2D obstacles
+        # for vectorized evaluation of the CBF and its gradients. The
+        # remaining obstacle types are evaluated through their own methods.
+        # All fields live in a single float64 block of shape (fields, capacity)
+        # so that each field is a contiguous row, grown geometrically. The
+        # dict only maps keys to rows, the evaluation sweeps the first `_n`
+        # rows of the block. The rows are partitioned such that the first
+        # `_n_aligned` ones hold the axis-aligned (theta = 0) ellipses which
+        # are evaluated by a cheaper kernel.
+        # The contained ellipses report their modifications back to the list,
+        # the rows of the modified ones (`_dirty` keys) are re-synced lazily
+        # before the next evaluation.
+        self._rows = {}
+        self._row_keys = []
+        self._row_objs = []
+        self._others = {}
+        self._dirty = set()
+        self._n = 0
+        self._n_aligned = 0
+        self._capacity = 0
+        self._params = np.empty((_N_ELLIPSE_FIELDS, 0))
+        self._pos = np.empty(0, dtype=np.intp)
+        self._kernel_buf = np.empty((3, 0))
+        self._set_views()
+        # Reusable output buffers, (re)allocated lazily once the size of
+        # the mapping has changed.
+        self._out_buf = np.empty(0)
+        self._grad_buf = np.empty((0, 3))
+        self._s = None
         self.update(data)
         self.timestamp = 0.0
     
@@ -807,6 +1026,12 @@ class ObstacleList2D(MutableMapping):
     
     def __delitem__(self, key):
         del self.mapping[key]
+        pos = self._remove_entry(key)
+        # The obstacles after the removed one move up by one position.
+        self._ellipse_pos[self._ellipse_pos > pos] -= 1
+        for other_key, (other_pos, obs) in self._others.items():
+            if other_pos > pos:
+                self._others[other_key] = (other_pos - 1, obs)
     
     def __setitem__(self, key, value):
         """
@@ -816,7 +1041,17 @@ class ObstacleList2D(MutableMapping):
         # Enforcing base class check using mro.
         if not Obstacle2DBase in value.__class__.__mro__:
             raise TypeError("Expected an object derived from Obstacle2DBase as value. Received " + type(value).__name__)
+        if key in self.mapping:
+            # Replacing a value keeps the position of the key.
+            pos = self._remove_entry(key)
+        else:
+            pos = len(self.mapping)
         self.mapping[key] = value
+        if isinstance(value, Ellipse2D):
+            self._append_row(key, value, pos)
+            value._add_owner(self, key)
+        else:
+            self._others[key] = (pos, value)
 
     def __iter__(self):
         return iter(self.mapping)
@@ -826,6 +1061,186 @@ class ObstacleList2D(MutableMapping):
     
     def __repr__(self):
         return f"{type(self).__name__}({self.mapping})"
+
+    def _reserve(self, n):
+        """
+        Ensures room for `n` ellipses in the parameter block, doubling the
+        capacity when exceeded. Existing rows are preserved.
+        """
+        if n <= self._capacity:
+            return
+        capacity = max(n, 2 * self._capacity, 8)
+        params = np.empty((_N_ELLIPSE_FIELDS, capacity))
+        params[:, :self._n] = self._params[:, :self._n]
+        pos = np.empty(capacity, dtype=np.intp)
+        pos[:self._n] = self._pos[:self._n]
+        self._params = params
+        self._pos = pos
+        self._kernel_buf = np.empty((3, capacity))
+        self._capacity = capacity
+
+    def _set_views(self):
+        """
+        Refreshes the views of the first `_n` entries of the output
+        positions and the kernel output buffers.
+        """
+        n = self._n
+        self._ellipse_pos = self._pos[:n]
+        self._f_buf, self._dx_buf, self._dy_buf = self._kernel_buf[:, :n]
+
+    def _append_row(self, key, obs, pos):
+        self._reserve(self._n + 1)
+        row = self._n
+        self._rows[key] = row
+        self._row_keys.append(key)
+        self._row_objs.append(obs)
+        self._pos[row] = pos
+        self._n = row + 1
+        self._set_views()
+        self._sync_row(row)
+
+    def _swap_rows(self, i, j):
+        if i == j:
+            return
+        self._params[:, [i, j]] = self._params[:, [j, i]]
+        self._pos[[i, j]] = self._pos[[j, i]]
+        key_i = self._row_keys[i]
+        key_j = self._row_keys[j]
+        self._row_keys[i], self._row_keys[j] = key_j, key_i
+        self._row_objs[i], self._row_objs[j] = self._row_objs[j], self._row_objs[i]
+        self._rows[key_i] = j
+        self._rows[key_j] = i
+
+    def _place_row(self, row):
+        """
+        Moves `row` to the aligned or the rotated side of the partition
+        according to its current orientation, by a single swap with the
+        row at the boundary.
+        """
+        aligned = self._params[_ST, row] == 0.0 and self._params[_CT, row] == 1.0
+        if aligned and row >= self._n_aligned:
+            self._swap_rows(row, self._n_aligned)
+            self._n_aligned += 1
+        elif not aligned and row < self._n_aligned:
+            self._n_aligned -= 1
+            self._swap_rows(row, self._n_aligned)
+
+    def _repartition(self, keys):
+        """
+        Restores the aligned/rotated partition after the rows of `keys` were
+        rewritten. Skipped when the partition still holds.
+        """
+        n = self._n
+        na = self._n_aligned
+        aligned = (self._params[_ST, :n] == 0.0) & (self._params[_CT, :n] == 1.0)
+        if aligned[:na].all() and not aligned[na:].any():
+            return
+        for key in keys:
+            self._place_row(self._rows[key])
+
+    def _remove_entry(self, key):
+        """
+        Removes the SoA row or the non-ellipse entry of `key` and returns
+        its output position. Rows are swap-removed, i.e. the last row is
+        moved into the freed one so the block stays dense. An aligned row
+        is first swapped to the partition boundary to keep the partition.
+        """
+        if key not in self._rows:
+            return self._others.pop(key)[0]
+        row = self._rows[key]
+        self._row_objs[row]._remove_owner(self, key)
+        self._dirty.discard(key)
+        if row < self._n_aligned:
+            self._n_aligned -= 1
+            self._swap_rows(row, self._n_aligned)
+            row = self._n_aligned
+        last = self._n - 1
+        self._swap_rows(row, last)
+        pos = int(self._pos[last])
+        del self._rows[key]
+        self._row_keys.pop()
+        self._row_objs.pop()
+        self._n = last
+        self._set_views()
+        return pos
+
+    def _ensure_buffers(self):
+        if self._out_buf.shape[0] != len(self.mapping):
+            self._out_buf = np.empty(len(self.mapping))
+            self._grad_buf = np.empty((len(self.mapping), 3))
+
+    @staticmethod
+    def _row_values(obs):
+        return (obs.center.x, obs.center.y, obs._ct, obs._st, obs._inv_a2, obs._inv_b2,
+                obs._kxa, obs._kxb, obs._kya, obs._kyb)
+
+    def _sync_row(self, row):
+        """
+        Copies the parameters of the Ellipse2D object at `row` into the SoA
+        block. Has to be called whenever the obstacle is updated.
+        """
+        self._dirty.discard(self._row_keys[row])
+        self._params[:, row] = self._row_values(self._row_objs[row])
+        self._place_row(row)
+
+    def _sync_rows(self, rows=None):
+        """
+        Batched `_sync_row` for a list of rows (all rows by default), written
+        into the SoA block with a single assignment.
+        """
+        if rows is None:
+            rows = slice(0, self._n)
+            keys = self._row_keys
+            objs = self._row_objs
+            self._dirty.clear()
+        else:
+            keys = [self._row_keys[row] for row in rows]
+            objs = [self._row_objs[row] for row in rows]
+            self._dirty.difference_update(keys)
+        if objs:
+            self._params[:, rows] = np.array([self._row_values(obs) for obs in objs]).T
+            self._repartition(list(keys))
+
+    def _mark_dirty(self, key):
+        self._dirty.add(key)
+
+    def _sync_dirty(self):
+        """
+        Re-syncs the rows of the ellipses modified since the last sync.
+        """
+        self._sync_rows([self._rows[key] for key in self._dirty])
+
+    def _state_xy(self, p=None):
+        """
+        Unpacks the evaluation point into two floats, once per evaluation.
+        The point `p` may be a `(px, py)` tuple, a 2-vector ndarray or cvxopt
+        matrix (row or column) or, for legacy callers, a euclid.Vector2. It
+        defaults to the state from the last `update_state` call.
+        """
+        if p is None:
+            if self._s is None:
+                raise ValueError("No state available to evaluate the obstacle list at. \
+                    Call update_state() or provide the point explicitly.")
+            return float(self._s[0]), float(self._s[1])
+        if isinstance(p, Vector2):
+            return float(p.x), float(p.y)
+        xy = np.asarray(p, dtype=float).ravel()
+        if xy.size != 2:
+            raise ValueError("Expected a (px, py) tuple, a 2-vector ndarray or matrix or a euclid.Vector2 for arg p, \
+                but got " + type(p).__name__ + " of size " + str(xy.size) + ".")
+        return float(xy[0]), float(xy[1])
+
+    def _evaluate_ellipses(self, px: float, py: float):
+        """
+        Runs the ellipse kernel over the SoA arrays at (px, py), filling the
+        reusable buffers `_f_buf`, `_dx_buf` and `_dy_buf`.
+        """
+        if self._dirty:
+            self._sync_dirty()
+        if self._n_aligned > 0:
+            _ellipse_f_grad_aligned(px, py, self._params, 0, self._n_aligned, self._kernel_buf)
+        if self._n > self._n_aligned:
+            _ellipse_f_grad(px, py, self._params, self._n_aligned, self._n, self._kernel_buf)
     
     def set_timestamp(self, timestamp: float):
         self.timestamp = timestamp
@@ -839,29 +1254,86 @@ class ObstacleList2D(MutableMapping):
         of the contained obstacle objects.
         """
         if bbox_dict is not None:
+            # Set difference of the key views, O(N + M) instead of
+            # scanning the incoming keys for every stored key.
+            for key in self.mapping.keys() - bbox_dict.keys():
+                del self[key]
+            
+            # Keys, not rows, since inserting a new aligned ellipse may swap
+            # the rows of the already updated ones.
+            keys = []
             for key, bbox in bbox_dict.items():
-                if key in self.mapping.keys():
+                if key in self.mapping:
                     self.mapping[key].update_by_bounding_box(bbox)
+                    if key in self._rows:
+                        keys.append(key)
                 else:
                     if obs_type == Obstacle2DTypes.ELLIPSE2D:
                         self.__setitem__(key, Ellipse2D.from_bounding_box(bbox=bbox, buffer=buffer, id=key))
                     if obs_type == Obstacle2DTypes.COLLISION_CONE2D:
                         self.__setitem__(key, CollisionCone2D.from_bounding_box(bbox=bbox, buffer=buffer, id=key))
             
-            # rm_keys = []
-            # for key in self.mapping.keys():
-            #     if key not in bbox_dict.keys():
-            #         rm_keys.append(key)
-            
-            for key in list(self.mapping.keys()):
-                if key not in list(bbox_dict.keys()):
-                    self.pop(key)
-            
-            # for key in rm_keys:
-            #     self.pop(key)
+            self._sync_rows([self._rows[key] for key in keys])
+
+    def update_by_bounding_box_batch(self, keys, cx: np.ndarray, cy: np.ndarray, a: np.ndarray, b: np.ndarray, theta: np.ndarray):
+        """
+        Vectorized equivalent of calling `update_by_bounding_box` on K
+        Ellipse2D obstacles already present in the list, with the center,
+        the axes (extents) and the orientation (radians) given as arrays of
+        length K.
+        cos/sin of theta are evaluated once over the whole batch and the SoA
+        rows are written with a single fancy-indexed assignment.
+
+        Raises:
+        ------
+            KeyError: A key is not present in the list.
+            TypeError: A key does not refer to an Ellipse2D obstacle.
+            ValueError: The arrays are not 1-D of the same length as `keys`.
+        """
+        keys = list(keys)
+        for key in keys:
+            if key not in self._rows:
+                if key in self.mapping:
+                    raise TypeError("Batched updates are only supported for Ellipse2D obstacles. Received key " + str(key)
+                                    + " of type " + type(self.mapping[key]).__name__)
+                raise KeyError(key)
+        
+        cx = np.asarray(cx, dtype=float)
+        cy = np.asarray(cy, dtype=float)
+        a = np.asarray(a, dtype=float)
+        b = np.asarray(b, dtype=float)
+        theta = np.asarray(theta, dtype=float)
+        # Broadcasting would silently write a single value into every row.
+        for name, arr in (('cx', cx), ('cy', cy), ('a', a), ('b', b), ('theta', theta)):
+            if arr.shape != (len(keys),):
+                raise ValueError("Expected a 1-D array of length " + str(len(keys)) + " for arg " + name
+                                 + ", but got shape " + str(arr.shape) + ".")
+        
+        rows = np.array([self._rows[key] for key in keys], dtype=np.intp)
+        objs = [self._row_objs[row] for row in rows.tolist()]
+        # Extents are the core axes, the buffers are applied on top.
+        offset = np.array([obs.buffer if obs.BUFFER_FLAG else 0.0 for obs in objs])
+        a_eff = a + offset
+        b_eff = b + offset
+        ct = np.cos(theta)
+        st = np.sin(theta)
+        inv_a2 = 1.0/(a_eff * a_eff)
+        inv_b2 = 1.0/(b_eff * b_eff)
+        self._params[:, rows] = np.stack((cx, cy, ct, st, inv_a2, inv_b2,
+                                          2 * ct * inv_a2, -2 * st * inv_b2, 2 * st * inv_a2, 2 * ct * inv_b2))
+        
+        for obs, x, y, a_, b_, theta_, ct_, st_ in zip(objs, cx.tolist(), cy.tolist(), a.tolist(), b.tolist(),
+                                                       theta.tolist(), ct.tolist(), st.tolist()):
+            obs._set_pose(Vector2(x, y), a_, b_, theta_, ct_, st_)
+        # The rows are already up to date.
+        self._dirty.difference_update(keys)
+        self._repartition(keys)
 
     def update_state(self, s: matrix, s_obs_dict: dict=None, buffer: float=None, **kwargs):
         
+        if s is not None:
+            self._s = matrix(s)
+        
         if s_obs_dict is None:                
             for obstacle in self.mapping.values():            
                 obstacle.update(s=s, s_obs=s_obs_dict, buffer=buffer, **kwargs)
@@ -869,51 +1341,93 @@ class ObstacleList2D(MutableMapping):
             if isinstance(s_obs_dict, dict):
                 for key in s_obs_dict.keys():
                     if key in self.mapping.keys():
-                        self.mapping.update(s=s, s_obs=s_obs_dict[key], buffer=buffer, **kwargs)
+                        self.mapping[key].update(s=s, s_obs=s_obs_dict[key], buffer=buffer, **kwargs)
                     else:
                         warnings.warn("Unknown key provided in s_obs_dict. Corresponsing key not found in the obstacle list.\
                             key: {key}")
             else:
-                ValueError("Expected dictionary for obstacle dictionary")
+                raise ValueError("Expected dictionary for obstacle dictionary")
+        
+        self._sync_rows()
     
-    def f(self, *args, **kwargs) -> float:
-        f = matrix(0.0, (len(self.mapping), 1))
-        idx = 0
-        for obs in self.mapping.values():
-            f[idx] = obs.f(**kwargs)
-            idx = idx + 1
-        return f
+    def evaluate_all(self, p=None, **kwargs):
+        """
+        Evaluates the CBFs and their gradients w.r.t. (x, y, theta) for all
+        the obstacles in a single sweep over the SoA block. Preferable over
+        separate calls to `f`, `dx`, `dy` and `dtheta` when all are needed.
 
-    def dx(self, *args, **kwargs) -> float:
-        dx = matrix(0.0, (len(self.mapping), 1))
-        idx = 0
-        for obs in self.mapping.values():
-            dx[idx] = obs.dx(**kwargs)
-            idx = idx + 1
-        return dx
+        Parameters:
+        ----------
+            p (tuple | np.ndarray | matrix | Vector2, optional): Point (px, py) to evaluate
+                at, defaults to the state from the last `update_state` call.
 
-    def dy(self, *args, **kwargs) -> float:
-        dy = matrix(0.0, (len(self.mapping), 1))
-        idx = 0
-        for obs in self.mapping.values():
-            dy[idx] = obs.dy(**kwargs)
-            idx = idx + 1
-        return dy
+        Returns:
+        -------
+            (matrix, matrix): f of shape (N, 1) and the gradient of shape (N, 3)
+        """
+        self._ensure_buffers()
+        f = self._out_buf
+        df = self._grad_buf
+        if self._rows:
+            px, py = self._state_xy(p)
+            self._evaluate_ellipses(px, py)
+            f[self._ellipse_pos] = self._f_buf
+            df[self._ellipse_pos, 0] = self._dx_buf
+            df[self._ellipse_pos, 1] = self._dy_buf
+        # dtheta is identically zero for the Ellipse2D obstacles, the other
+        # obstacle rows are overwritten below.
+        df[:, 2] = 0.0
+        f = matrix(f)
+        df = matrix(df)
+        for idx, obs in self._others.values():
+            f[idx] = obs.f(**kwargs)
+            df[idx, 0] = obs.dx(**kwargs)
+            df[idx, 1] = obs.dy(**kwargs)
+            df[idx, 2] = obs.dtheta(**kwargs)
+        return f, df
+
+    def _evaluate_component(self, comp: int, p=None, **kwargs) -> matrix:
+        """
+        Evaluates a single one of f, dx and dy for all the obstacles, selected
+        by its row `comp` (0, 1 or 2) in the kernel output buffer.
+        """
+        self._ensure_buffers()
+        out = self._out_buf
+        if self._rows:
+            px, py = self._state_xy(p)
+            self._evaluate_ellipses(px, py)
+            out[self._ellipse_pos] = self._kernel_buf[comp, :self._n]
+        out = matrix(out)
+        method = ('f', 'dx', 'dy')[comp]
+        for idx, obs in self._others.values():
+            out[idx] = getattr(obs, method)(**kwargs)
+        return out
+
+    def f(self, p=None, **kwargs) -> matrix:
+        return self._evaluate_component(0, p, **kwargs)
+
+    def dx(self, p=None, **kwargs) -> matrix:
+        return self._evaluate_component(1, p, **kwargs)
+
+    def dy(self, p=None, **kwargs) -> matrix:
+        return self._evaluate_component(2, p, **kwargs)
     
-    def dtheta(self, *args, **kwargs) -> float:
-        dtheta = matrix(0.0, (len(self.mapping), 1))
-        idx = 0
-        for obs in self.mapping.values():
+    def dtheta(self, p=None, **kwargs) -> matrix:
+        # dtheta is identically zero for the Ellipse2D obstacles.
+        self._ensure_buffers()
+        self._out_buf[:] = 0.0
+        dtheta = matrix(self._out_buf)
+        for idx, obs in self._others.values():
             dtheta[idx] = obs.dtheta(**kwargs)
-            idx = idx + 1
         return dtheta
     
-    def dv(self, *args, **kwargs) -> float:
-        dv = matrix(0.0, (len(self.mapping), 1))
-        idx = 0
-        for obs in self.mapping.values():
+    def dv(self, *args, **kwargs) -> matrix:
+        # dv is identically zero for the Ellipse2D obstacles.
+        self._ensure_buffers()
+        self._out_buf[:] = 0.0
+        dv = matrix(self._out_buf)
+        for idx, obs in self._others.values():
             dv[idx] = obs.dv(**kwargs)
-            idx = idx + 1
         return dv
     
     def dt(self, *args, **kwargs) -> float:
@@ -924,18 +1438,14 @@ class ObstacleList2D(MutableMapping):
             idx = idx + 1
         return dt
     
-    def dbeta(self, *args, **kwargs) -> float:
-        dbeta = matrix(0.0, (len(self.mapping), 1))
-        idx = 0
-        for obs in self.mapping.values():
+    def dbeta(self, *args, **kwargs) -> matrix:
+        # dbeta is identically zero for the Ellipse2D obstacles.
+        self._ensure_buffers()
+        self._out_buf[:] = 0.0
+        dbeta = matrix(self._out_buf)
+        for idx, obs in self._others.values():
             dbeta[idx] = obs.dbeta(**kwargs)
-            idx = idx + 1
         return dbeta
 
-    def gradient(self, *args, **kwargs) -> float:
-        df = matrix(0.0, (len(self.mapping), 3))
-        idx = 0
-        for obs in self.mapping.values():
-            df[idx,:] = obs.gradient(**kwargs).T
-            idx = idx + 1
-        return df
+    def gradient(self, p=None, **kwargs) -> matrix:
+        return self.evaluate_all(p, **kwargs)[1]